@@ -5,9 +5,12 @@ Uses pydantic BaseSettings for validation and type safety.
 """
 from pathlib import Path
 from typing import Optional
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, field_validator
 
+# taskflow/ (the directory holding app/); data/ and logs/ default to subdirectories of it
+_PROJECT_ROOT = Path(__file__).parent.parent
+
 
 class Settings(BaseSettings):
     """
@@ -20,6 +23,7 @@ class Settings(BaseSettings):
     
     Optional variables:
     - GEMINI_API_KEY (for AI features)
+    - GEMINI_MODEL (preferred Gemini model name, tried before the defaults)
     - SERPAPI_KEY (for flight search)
     - ENVIRONMENT (dev/prod, defaults to dev)
     - WHATSAPP_BUSINESS_ID (optional, for Meta integration)
@@ -28,12 +32,12 @@ class Settings(BaseSettings):
     # Application
     APP_NAME: str = "Evara"
     APP_VERSION: str = "1.0.0"
-    ENVIRONMENT: str = Field(default="dev", env="ENVIRONMENT")
-    DEBUG: bool = Field(default=False, env="DEBUG")
+    ENVIRONMENT: str = Field(default="dev")
+    DEBUG: bool = Field(default=False)
     
     # Server
-    HOST: str = Field(default="0.0.0.0", env="HOST")
-    PORT: int = Field(default=8000, env="PORT")
+    HOST: str = Field(default="0.0.0.0")
+    PORT: int = Field(default=8000)
     
     @field_validator("PORT", mode="before")
     @classmethod
@@ -51,28 +55,59 @@ class Settings(BaseSettings):
         return v if v is not None else 8000
     
     # Meta (Facebook) WhatsApp Business API (Required for WhatsApp, but allow app to start without them)
-    META_ACCESS_TOKEN: Optional[str] = Field(default=None, env="META_ACCESS_TOKEN")
-    PHONE_NUMBER_ID: Optional[str] = Field(default=None, env="PHONE_NUMBER_ID")
-    META_VERIFY_TOKEN: Optional[str] = Field(default=None, env="META_VERIFY_TOKEN")
-    WHATSAPP_BUSINESS_ID: Optional[str] = Field(default=None, env="WHATSAPP_BUSINESS_ID")
+    META_ACCESS_TOKEN: Optional[str] = Field(default=None)
+    PHONE_NUMBER_ID: Optional[str] = Field(default=None)
+    META_VERIFY_TOKEN: Optional[str] = Field(default=None)
+    WHATSAPP_BUSINESS_ID: Optional[str] = Field(default=None)
     
     # Google Gemini API (Optional - for AI features)
-    GEMINI_API_KEY: Optional[str] = Field(default=None, env="GEMINI_API_KEY")
+    GEMINI_API_KEY: Optional[str] = Field(default=None)
+    GEMINI_MODEL: Optional[str] = Field(default=None)
+    GEMINI_TIMEOUT_SECONDS: float = Field(default=30.0)
+    # Retries stop once waiting for the next one would go past this many seconds from the first attempt
+    GEMINI_RETRY_BUDGET_SECONDS: float = Field(default=20.0)
+    GEMINI_MAX_CONCURRENCY: int = Field(default=8)
+    GEMINI_PROMPT_CACHE_MAX_ENTRIES: int = Field(default=4096)
+    GEMINI_PROMPT_CACHE_TTL_SECONDS: int = Field(default=3600)
+    # One-token request at startup so the first user message doesn't pay for connecting
+    GEMINI_WARMUP_ENABLED: bool = Field(default=True)
+    # Explicit Gemini context cache for the static intent-classification instructions (billed storage, opt-in)
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = Field(default=False)
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS: int = Field(default=3600)
+    # Let likely general chat get its reply from the classification call (one Gemini call, but not streamed)
+    GEMINI_FUSED_GENERAL_ENABLED: bool = Field(default=False)
     
     # SerpAPI (Optional - for flight search)
-    SERPAPI_KEY: Optional[str] = Field(default=None, env="SERPAPI_KEY")
+    SERPAPI_KEY: Optional[str] = Field(default=None)
+    
+    # Gemini intent-classification batching (batch size 1 = disabled, lowest latency)
+    GEMINI_BATCH_SIZE: int = Field(default=1)
+    GEMINI_BATCH_FLUSH_INTERVAL_MS: int = Field(default=0)
+    # Messages + context per batched prompt (~4 chars/token); long batch prompts slow down non-linearly
+    GEMINI_BATCH_MAX_PROMPT_CHARS: int = Field(default=16000)
+    
+    # Semantic Cache (Optional - requires numpy and sentence-transformers)
+    SEMANTIC_CACHE_ENABLED: bool = Field(default=True)
+    SEMANTIC_CACHE_THRESHOLD: float = Field(default=0.87)
+    # Reusing a reply needs a closer paraphrase than reusing a classification
+    # ("capital of France" / "capital of Spain" share an intent, not an answer)
+    SEMANTIC_RESPONSE_CACHE_THRESHOLD: float = Field(default=0.95)
+    SEMANTIC_CACHE_MAX_ENTRIES: int = Field(default=1024)
+    SEMANTIC_CACHE_TTL_SECONDS: int = Field(default=3600)
+    SEMANTIC_CACHE_FILE: str = Field(default="semantic_cache.npz")
+    
+    # Exact-match cache (repeated identical messages; no extra dependencies)
+    EXACT_CACHE_ENABLED: bool = Field(default=True)
+    EXACT_CACHE_MAX_ENTRIES: int = Field(default=4096)
     
     # Storage
-    DATA_DIR: Path = Field(default=Path(__file__).parent.parent / "data")
-    LOGS_DIR: Path = Field(default=Path(__file__).parent.parent / "logs")
-    MEMORY_FILE: str = Field(default="user_memory.json", env="MEMORY_FILE")
+    DATA_DIR: Path = Field(default=_PROJECT_ROOT / "data")
+    LOGS_DIR: Path = Field(default=_PROJECT_ROOT / "logs")
+    MEMORY_FILE: str = Field(default="user_memory.json")
     
     # Logging
-    LOG_LEVEL: str = Field(default="INFO", env="LOG_LEVEL")
-    LOG_FORMAT: str = Field(
-        default="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        env="LOG_FORMAT"
-    )
+    LOG_LEVEL: str = Field(default="INFO")
+    LOG_FORMAT: str = Field(default="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     
     @field_validator("ENVIRONMENT")
     @classmethod
@@ -89,7 +124,8 @@ class Settings(BaseSettings):
         """Ensure directories exist."""
         if isinstance(v, str):
             v = Path(v)
-        v.mkdir(parents=True, exist_ok=True)
+        if not v.is_dir():
+            v.mkdir(parents=True, exist_ok=True)
         return v
     
     @field_validator("LOG_LEVEL")
@@ -102,11 +138,13 @@ class Settings(BaseSettings):
             raise ValueError(f"LOG_LEVEL must be one of {valid_levels}, got '{v}'")
         return v_upper
     
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-        case_sensitive = True
-        extra = "ignore"  # Ignore extra environment variables
+    # Fields are read from the environment variable of the same name
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=True,
+        extra="ignore",  # Ignore extra environment variables
+    )
 
 
 # Global settings instance
@@ -132,7 +170,6 @@ except Exception as e:
     logger.error(f"❌ Configuration Error: {e}")
     logger.error("App will start but may have limited functionality.")
     # Create minimal settings to allow app to start
-    from pathlib import Path
     class MinimalSettings:
         APP_NAME = "Evara"
         APP_VERSION = "1.0.0"
@@ -144,10 +181,31 @@ except Exception as e:
         PHONE_NUMBER_ID = None
         META_VERIFY_TOKEN = None
         GEMINI_API_KEY = None
+        GEMINI_MODEL = None
+        GEMINI_TIMEOUT_SECONDS = 30.0
+        GEMINI_RETRY_BUDGET_SECONDS = 20.0
+        GEMINI_MAX_CONCURRENCY = 8
+        GEMINI_PROMPT_CACHE_MAX_ENTRIES = 4096
+        GEMINI_PROMPT_CACHE_TTL_SECONDS = 3600
+        GEMINI_WARMUP_ENABLED = True
+        GEMINI_CONTEXT_CACHE_ENABLED = False
+        GEMINI_CONTEXT_CACHE_TTL_SECONDS = 3600
+        GEMINI_FUSED_GENERAL_ENABLED = False
         SERPAPI_KEY = None
+        GEMINI_BATCH_SIZE = 1
+        GEMINI_BATCH_FLUSH_INTERVAL_MS = 0
+        GEMINI_BATCH_MAX_PROMPT_CHARS = 16000
+        SEMANTIC_CACHE_ENABLED = False
+        SEMANTIC_CACHE_THRESHOLD = 0.87
+        SEMANTIC_RESPONSE_CACHE_THRESHOLD = 0.95
+        SEMANTIC_CACHE_MAX_ENTRIES = 1024
+        SEMANTIC_CACHE_TTL_SECONDS = 3600
+        SEMANTIC_CACHE_FILE = "semantic_cache.npz"
+        EXACT_CACHE_ENABLED = True
+        EXACT_CACHE_MAX_ENTRIES = 4096
         MEMORY_FILE = "user_memory.json"
-        DATA_DIR = Path(__file__).parent.parent / "data"
-        LOGS_DIR = Path(__file__).parent.parent / "logs"
+        DATA_DIR = _PROJECT_ROOT / "data"
+        LOGS_DIR = _PROJECT_ROOT / "logs"
         # Ensure directories exist
         DATA_DIR.mkdir(parents=True, exist_ok=True)
         LOGS_DIR.mkdir(parents=True, exist_ok=True)
@@ -159,18 +217,21 @@ def get_memory_file_path() -> Path:
     if hasattr(settings, 'DATA_DIR') and settings.DATA_DIR:
         return settings.DATA_DIR / settings.MEMORY_FILE
     # Fallback if DATA_DIR not set
-    from pathlib import Path
-    data_dir = Path(__file__).parent.parent / "data"
+    data_dir = _PROJECT_ROOT / "data"
     data_dir.mkdir(parents=True, exist_ok=True)
     return data_dir / settings.MEMORY_FILE
 
 
+def get_semantic_cache_file_path() -> Path:
+    """Get the full path to the persisted semantic cache."""
+    return get_memory_file_path().parent / settings.SEMANTIC_CACHE_FILE
+
+
 def get_log_file_path() -> Path:
     """Get the full path to the log file."""
     if hasattr(settings, 'LOGS_DIR') and settings.LOGS_DIR:
         return settings.LOGS_DIR / "evara.log"
     # Fallback if LOGS_DIR not set
-    from pathlib import Path
-    logs_dir = Path(__file__).parent.parent / "logs"
+    logs_dir = _PROJECT_ROOT / "logs"
     logs_dir.mkdir(parents=True, exist_ok=True)
     return logs_dir / "evara.log"
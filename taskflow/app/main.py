@@ -3,11 +3,13 @@ Evara - WhatsApp AI Task Automation Agent
 Main FastAPI application with Meta WhatsApp Business API integration.
 """
 import asyncio
+import heapq
 import logging
+import time
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
 
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import PlainTextResponse, JSONResponse
@@ -16,11 +18,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from .config import settings, get_log_file_path, get_memory_file_path
 from .utils.logger import setup_logging
 from .utils.rate_limiter import RateLimiter
-from .utils.messages import get_welcome_message, get_help_message, get_friendly_error_message
+from .utils.messages import get_welcome_message, get_help_message, get_thanks_message, get_friendly_error_message
 from .agent import AgentOrchestrator
-from .tools.reminder import ReminderTool
+from .tools.reminder import ReminderTool, reminders_changed
 from .memory import MemoryStore
 from .services.meta_whatsapp import MetaWhatsAppClient
+from .utils.gemini import warm_up_gemini
 
 
 # Setup logging
@@ -42,7 +45,17 @@ _memory_cleanup_task: Optional[asyncio.Task] = None
 rate_limiter: Optional[RateLimiter] = None
 
 # IST timezone
-IST = pytz.timezone('Asia/Kolkata')
+IST = ZoneInfo('Asia/Kolkata')
+
+# Commands answered without the agent (matched after lowercasing and trimming punctuation)
+_HELP_COMMANDS = frozenset({"help", "hi", "hello", "hey"})
+_THANKS_COMMANDS = frozenset({"thanks", "thank you", "thanks a lot", "thank you so much", "thx", "ty"})
+
+# First-time users get the welcome message followed by the help
+_WELCOME_AND_HELP_MESSAGE = f"{get_welcome_message()}\n\n{get_help_message()}"
+
+# How long a finished reply waits for a still-pending typing indicator before sending anyway
+TYPING_INDICATOR_GRACE_SECONDS = 1.0
 
 
 async def cleanup_old_memory_loop(memory_store: MemoryStore):
@@ -62,7 +75,7 @@ async def cleanup_old_memory_loop(memory_store: MemoryStore):
             await asyncio.sleep(24 * 60 * 60)  # 24 hours in seconds
             
             logger.info("🧹 Starting scheduled memory cleanup...")
-            result = memory_store.cleanup_old_conversations(hours=24)
+            result = await asyncio.to_thread(memory_store.cleanup_old_conversations, hours=24)
             
             if result["deleted_conversations"] > 0:
                 logger.info(
@@ -82,101 +95,167 @@ async def cleanup_old_memory_loop(memory_store: MemoryStore):
             await asyncio.sleep(60 * 60)
 
 
+# A reminder still fires up to this many seconds after its due time (e.g. on a send retry);
+# pending reminders that are later than that are left alone
+REMINDER_GRACE_SECONDS = 20
+
+# Wait before retrying a reminder whose WhatsApp send failed
+REMINDER_RETRY_SECONDS = 10
+
+# The schedule is rebuilt from disk at least this often, even when nothing is due
+REMINDER_RESYNC_SECONDS = 60
+
+
+def _build_reminder_schedule(
+    pending_reminders: List[Dict[str, Any]],
+    due_epochs: Dict[str, float],
+    retry_at: Dict[str, float],
+    now: float
+) -> Tuple[List[tuple], Dict[str, float]]:
+    """
+    Build the min-heap of pending reminders that can still fire.
+    
+    Args:
+        pending_reminders: Pending reminders (with user_number) from the memory store
+        due_epochs: Epoch seconds per stored datetime string from the previous build,
+            so reminders saved without a due_epoch aren't parsed again
+        retry_at: Epoch seconds of the next attempt, per reminder id whose send failed
+        now: Current epoch seconds
+        
+    Returns:
+        Tuple of (heap of (fire_at, reminder_id, user_number, task, due_at), due_epochs
+        for the datetimes parsed so far that are still pending)
+    """
+    heap = []
+    seen_epochs = {}
+    for reminder in pending_reminders:
+        reminder_dt_str = reminder.get("datetime")
+        reminder_id = reminder.get("id")
+        user_number = reminder.get("user_number")
+        
+        if not reminder_id or not reminder_dt_str:
+            logger.warning(f"⚠️  Reminder {reminder_id} missing id or datetime field")
+            continue
+        
+        if not user_number:
+            logger.warning(f"⚠️  Reminder {reminder_id} missing user_number field")
+            continue
+        
+        due_at = reminder.get("due_epoch")
+        if due_at is None:
+            # Reminders saved before due_epoch existed only have the ISO string; parse each once
+            due_at = due_epochs.get(reminder_dt_str)
+            if due_at is None:
+                try:
+                    reminder_dt = datetime.fromisoformat(reminder_dt_str)
+                except ValueError as e:
+                    logger.error(f"❌ Error processing reminder {reminder_id}: {e}")
+                    continue
+                if reminder_dt.tzinfo is None:
+                    reminder_dt = reminder_dt.replace(tzinfo=IST)
+                due_at = reminder_dt.timestamp()
+            seen_epochs[reminder_dt_str] = due_at
+        
+        fire_at = max(due_at, retry_at.get(reminder_id, 0.0))
+        if max(now, fire_at) - due_at >= REMINDER_GRACE_SECONDS:
+            continue
+        heap.append((fire_at, reminder_id, user_number, reminder.get("task", "Reminder"), due_at))
+    
+    heapq.heapify(heap)
+    return heap, seen_epochs
+
+
 async def check_reminders_loop(reminder_tool: ReminderTool, memory_store: MemoryStore):
     """
-    Background task that checks for due reminders every 15 seconds for accurate timing.
+    Background task that sends reminders when they fall due.
+    
+    Pending reminders are kept in a min-heap on their due time, and the loop sleeps
+    until the earliest one (or until a reminder is set or cancelled) instead of
+    scanning every reminder on a fixed interval. The heap is rebuilt from disk when
+    a reminder is due, after changes, and at least every REMINDER_RESYNC_SECONDS.
     
     Args:
         reminder_tool: ReminderTool instance
         memory_store: MemoryStore instance
     """
-    logger.info("🔄 Reminder checker loop started (checking every 15 seconds for accuracy)")
+    logger.info("🔄 Reminder scheduler started")
+    
+    heap: List[tuple] = []
+    due_epochs: Dict[str, float] = {}
+    retry_at: Dict[str, float] = {}
+    next_resync = 0.0
     
     while True:
         try:
-            await asyncio.sleep(15)  # Check every 15 seconds for more accurate timing
-            
-            # CRITICAL FIX: Reload memory from disk to get latest reminders
-            # This ensures we see reminders added after app startup
-            memory_store.load()
-            logger.debug("🔄 Reloaded memory from disk")
-            
-            # Get all pending reminders
-            pending_reminders = memory_store.get_all_pending_reminders()
-            
-            now_ist = datetime.now(IST)
-            logger.info(f"⏰ Reminder check at {now_ist.strftime('%I:%M:%S %p IST')} - Found {len(pending_reminders)} pending reminder(s)")
-            
-            if not pending_reminders:
-                continue
+            now = time.time()
+            if reminders_changed.is_set() or now >= next_resync or (heap and heap[0][0] <= now):
+                reminders_changed.clear()
+                # Reload memory from disk to see reminders set or cancelled since the last build
+                # (file I/O runs in a worker thread so webhooks aren't stalled meanwhile)
+                await asyncio.to_thread(memory_store.load)
+                pending_reminders = await asyncio.to_thread(memory_store.get_all_pending_reminders)
+                retry_at = {rid: at for rid, at in retry_at.items() if at > now - REMINDER_GRACE_SECONDS}
+                heap, due_epochs = _build_reminder_schedule(pending_reminders, due_epochs, retry_at, now)
+                next_resync = now + REMINDER_RESYNC_SECONDS
+                logger.debug(
+                    "⏰ Reminder schedule rebuilt: %d pending, %d scheduled",
+                    len(pending_reminders), len(heap)
+                )
             
-            # Check each reminder
-            for reminder in pending_reminders:
+            # Fire everything that's due
+            while heap and heap[0][0] <= now:
+                entry = heapq.heappop(heap)
+                _, reminder_id, user_number, task, due_at = entry
                 try:
-                    reminder_dt_str = reminder.get("datetime")
-                    reminder_id = reminder.get("id")
-                    user_number = reminder.get("user_number")
-                    task = reminder.get("task", "Reminder")
+                    logger.info(
+                        f"🔔 FIRING REMINDER {reminder_id[:8]}... for {user_number} - '{task}' "
+                        f"({now - due_at:.1f}s after due time)"
+                    )
                     
-                    if not reminder_dt_str:
-                        logger.warning(f"⚠️  Reminder {reminder_id} missing datetime field")
-                        continue
+                    # Send reminder notification
+                    message = (
+                        f"⏰ REMINDER:\n"
+                        f"📝 {task}\n\n"
+                        f"Want me to snooze for 1 hour?"
+                    )
                     
-                    if not user_number:
-                        logger.warning(f"⚠️  Reminder {reminder_id} missing user_number field")
-                        continue
-                    
-                    # Parse datetime
-                    reminder_dt = datetime.fromisoformat(reminder_dt_str)
-                    if reminder_dt.tzinfo is None:
-                        reminder_dt = IST.localize(reminder_dt)
+                    # Format user number for WhatsApp
+                    # Meta format: Need to ensure it has + prefix
+                    if not user_number.startswith("+"):
+                        whatsapp_number = f"+{user_number}"
                     else:
-                        # Convert to IST for comparison
-                        reminder_dt = reminder_dt.astimezone(IST)
-                    
-                    # Check if reminder is due (within the last 20 seconds for exact timing)
-                    # This gives us some buffer but ensures we send it right after the scheduled time
-                    time_diff = (now_ist - reminder_dt).total_seconds()
+                        whatsapp_number = user_number
                     
-                    logger.info(f"📋 Reminder {reminder_id[:8]}... for {user_number}: "
-                               f"Due at {reminder_dt.strftime('%I:%M:%S %p')}, "
-                               f"Time diff: {time_diff:.1f}s, "
-                               f"Status: {'DUE!' if 0 <= time_diff < 20 else 'waiting'}")
+                    logger.info(f"📤 Sending reminder to WhatsApp number: {whatsapp_number}")
+                    success = await send_whatsapp_message(whatsapp_number, message)
                     
-                    if 0 <= time_diff < 20:  # Due in the last 20 seconds (catches it on first check after due time)
-                        logger.info(f"🔔 FIRING REMINDER {reminder_id[:8]}... for {user_number} - '{task}'")
-                        
-                        # Send reminder notification
-                        message = (
-                            f"⏰ REMINDER:\n"
-                            f"📝 {task}\n\n"
-                            f"Want me to snooze for 1 hour?"
+                    if success:
+                        # Mark reminder as sent
+                        await asyncio.to_thread(
+                            memory_store.update_reminder,
+                            user_number,
+                            reminder_id,
+                            {"status": "sent", "sent_at": datetime.now(IST).isoformat()}
                         )
-                        
-                        # Format user number for WhatsApp
-                        # Meta format: Need to ensure it has + prefix
-                        if not user_number.startswith("+"):
-                            whatsapp_number = f"+{user_number}"
-                        else:
-                            whatsapp_number = user_number
-                        
-                        logger.info(f"📤 Sending reminder to WhatsApp number: {whatsapp_number}")
-                        success = await send_whatsapp_message(whatsapp_number, message)
-                        
-                        if success:
-                            # Mark reminder as sent
-                            memory_store.update_reminder(
-                                user_number,
-                                reminder_id,
-                                {"status": "sent", "sent_at": now_ist.isoformat()}
-                            )
-                            logger.info(f"✅ Successfully sent reminder to {whatsapp_number}: {task}")
-                        else:
-                            logger.error(f"❌ Failed to send reminder to {whatsapp_number} - send_whatsapp_message returned False")
+                        retry_at.pop(reminder_id, None)
+                        logger.info(f"✅ Successfully sent reminder to {whatsapp_number}: {task}")
+                    else:
+                        logger.error(f"❌ Failed to send reminder to {whatsapp_number} - send_whatsapp_message returned False")
+                        retry = now + REMINDER_RETRY_SECONDS
+                        if retry - due_at < REMINDER_GRACE_SECONDS:
+                            retry_at[reminder_id] = retry
+                            heapq.heappush(heap, (retry,) + entry[1:])
                 
                 except Exception as e:
-                    logger.error(f"❌ Error processing reminder {reminder.get('id', 'unknown')}: {e}", exc_info=True)
+                    logger.error(f"❌ Error processing reminder {reminder_id}: {e}", exc_info=True)
                     continue
+            
+            # Sleep until the next reminder is due, the next resync, or a reminder change
+            wake_at = min(heap[0][0], next_resync) if heap else next_resync
+            try:
+                await asyncio.wait_for(reminders_changed.wait(), timeout=max(wake_at - time.time(), 0.0))
+            except asyncio.TimeoutError:
+                pass
                     
         except asyncio.CancelledError:
             logger.info("🔄 Reminder checker loop cancelled")
@@ -192,7 +271,6 @@ async def lifespan(app: FastAPI):
     Lifecycle manager for the FastAPI application.
     Handles startup and shutdown events with optimizations for Render deployment.
     """
-    import time
     startup_start = time.time()
     
     # Startup
@@ -232,6 +310,7 @@ async def lifespan(app: FastAPI):
         # Don't raise - allow app to start for health checks
     
     # Initialize Agent Orchestrator (caches Gemini client)
+    gemini_warmup_task = None
     try:
         agent = AgentOrchestrator()
         logger.info("✅ Agent orchestrator initialized successfully")
@@ -239,6 +318,9 @@ async def lifespan(app: FastAPI):
         # Preload Gemini client if available (cache for faster responses)
         if agent.gemini_model:
             logger.info("✅ Gemini client cached and ready")
+            if settings.GEMINI_WARMUP_ENABLED:
+                # Connect in the background; startup doesn't wait on the API
+                gemini_warmup_task = asyncio.create_task(warm_up_gemini(agent.gemini_model))
     except Exception as e:
         logger.error(f"❌ Failed to initialize agent orchestrator: {e}")
         # Don't raise - allow app to start even if agent fails (for testing)
@@ -294,6 +376,13 @@ async def lifespan(app: FastAPI):
     logger.info("👋 Shutting down Evara...")
     shutdown_start = time.time()
     
+    # Let in-flight conversation writes finish so the final save includes them
+    try:
+        if agent:
+            await agent.wait_for_background_tasks(timeout=5.0)
+    except Exception as e:
+        logger.debug(f"Background task drain: {e}")
+    
     # Save memory before exit
     try:
         if memory_store:
@@ -302,6 +391,13 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ Failed to save memory: {e}")
     
+    # Save semantic cache so paraphrase hits survive the restart
+    try:
+        if agent:
+            agent.save_semantic_cache()
+    except Exception as e:
+        logger.error(f"❌ Failed to save semantic cache: {e}")
+    
     # Close Playwright browser
     try:
         if agent and hasattr(agent, 'price_tool'):
@@ -315,6 +411,13 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.debug(f"Browser close: {e}")
     
+    # Close the WhatsApp client's pooled connections
+    try:
+        if meta_client:
+            await meta_client.close()
+    except Exception as e:
+        logger.debug(f"WhatsApp client close: {e}")
+    
     # Cancel reminder checker task
     if _reminder_checker_task:
         _reminder_checker_task.cancel()
@@ -333,6 +436,14 @@ async def lifespan(app: FastAPI):
             pass
         logger.info("✅ Memory cleanup stopped")
     
+    # Cancel Gemini warm-up if it's still waiting on the API
+    if gemini_warmup_task and not gemini_warmup_task.done():
+        gemini_warmup_task.cancel()
+        try:
+            await gemini_warmup_task
+        except (asyncio.CancelledError, Exception):
+            pass
+    
     # Cancel browser preload task if still running
     if browser_preload_task and not browser_preload_task.done():
         browser_preload_task.cancel()
@@ -427,19 +538,23 @@ async def process_incoming_message(from_number: str, message_body: str) -> str:
         return get_friendly_error_message("initialization")
     
     # Check for help/greeting commands (before processing)
-    message_lower = message_body.lower().strip()
-    if message_lower in ["help", "hi", "hello", "hey"]:
+    # Trailing punctuation doesn't change a command ("hi!", "thanks.")
+    command = message_body.lower().strip().rstrip("!.? ")
+    if command in _HELP_COMMANDS:
         # Check if first-time user
-        user_memory = agent.memory_store.get_user_memory(from_number)
+        user_memory = await asyncio.to_thread(agent.memory_store.get_user_memory, from_number)
         conversation_history = user_memory.get("conversation_history", [])
         is_first_time = len(conversation_history) == 0
         
         if is_first_time:
-            welcome_msg = get_welcome_message()
-            return f"{welcome_msg}\n\n{get_help_message()}"
+            return _WELCOME_AND_HELP_MESSAGE
         else:
             return get_help_message()
     
+    # Plain thank-yous get a static reply (no LLM call needed)
+    if command in _THANKS_COMMANDS:
+        return get_thanks_message()
+    
     # Use agent to process message (for all other messages including general questions)
     try:
         response = await agent.process_message(from_number, message_body)
@@ -474,14 +589,14 @@ async def debug_reminders():
     """Debug endpoint to check pending reminders."""
     try:
         memory_store = MemoryStore()
-        pending = memory_store.get_all_pending_reminders()
+        pending = await asyncio.to_thread(memory_store.get_all_pending_reminders)
         now_ist = datetime.now(IST)
         
         reminders_info = []
         for r in pending:
             reminder_dt = datetime.fromisoformat(r.get("datetime"))
             if reminder_dt.tzinfo is None:
-                reminder_dt = IST.localize(reminder_dt)
+                reminder_dt = reminder_dt.replace(tzinfo=IST)
             else:
                 reminder_dt = reminder_dt.astimezone(IST)
             
@@ -613,9 +728,22 @@ async def handle_meta_webhook(request: Request):
         logger.info(f"Message ID: {message_id}")
         logger.info(f"Body: {message_body[:100]}...")
         
+        # Show "typing..." while the response is generated (runs concurrently)
+        typing_task = None
+        if parsed_message.get("message_id"):
+            typing_task = asyncio.create_task(meta_client.send_typing_indicator(message_id))
+        
         # Process the message and generate response
         response_message = await process_incoming_message(from_number, message_body)
         
+        # Give the indicator a moment to land so it can't arrive after (and re-show over)
+        # the reply, but don't hold the reply up for a slow one - it's cancelled instead
+        if typing_task:
+            try:
+                await asyncio.wait_for(typing_task, timeout=TYPING_INDICATOR_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                logger.debug(f"Typing indicator for {message_id} still pending, sending reply anyway")
+        
         # Send response back to user
         success = await send_whatsapp_message(from_number, response_message)
         
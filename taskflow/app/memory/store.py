@@ -3,10 +3,12 @@ Memory store for TaskFlow.
 Handles persistent storage of user data and conversation history.
 Enhanced with thread-safe operations, atomic writes, and backup system.
 """
+import functools
 import json
 import logging
 import shutil
 import tempfile
+import threading
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
@@ -32,6 +34,15 @@ from ..config import get_memory_file_path, settings
 logger = logging.getLogger("taskflow")
 
 
+def _synchronized(method):
+    """Serialize access to the in-memory store (callers may run in worker threads)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._thread_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class MemoryStore:
     """
     Manages user memory storage in JSON format.
@@ -53,6 +64,7 @@ class MemoryStore:
         self._backup_dir.mkdir(parents=True, exist_ok=True)
         self._last_backup_date = None
         self._lock_fd = None
+        self._thread_lock = threading.RLock()
         
         self._load_memory()
         self._check_and_backup()
@@ -93,6 +105,7 @@ class MemoryStore:
         except Exception as e:
             logger.debug(f"Could not release file lock: {e}")
     
+    @_synchronized
     def _load_memory(self) -> None:
         """Load memory from JSON file with error handling."""
         self._acquire_lock()
@@ -146,6 +159,7 @@ class MemoryStore:
         finally:
             self._release_lock()
     
+    @_synchronized
     def _save_memory(self) -> None:
         """Save memory to JSON file atomically with error handling."""
         self._acquire_lock()
@@ -283,6 +297,7 @@ class MemoryStore:
                 "created_at": datetime.now().isoformat()
             }
     
+    @_synchronized
     def get_user_memory(self, user_number: str) -> Dict[str, Any]:
         """
         Get memory for a specific user.
@@ -342,6 +357,7 @@ class MemoryStore:
         
         return users[normalized_number]
     
+    @_synchronized
     def get_user_context(self, user_number: str) -> Dict[str, Any]:
         """
         Get full user context (alias for get_user_memory for Phase 6 compatibility).
@@ -354,6 +370,7 @@ class MemoryStore:
         """
         return self.get_user_memory(user_number)
     
+    @_synchronized
     def add_conversation(
         self,
         user_number: str,
@@ -430,6 +447,7 @@ class MemoryStore:
         """
         self.add_conversation(user_number, message, response, intent)
     
+    @_synchronized
     def get_recent_conversations(self, user_number: str, limit: int = 5) -> List[Dict[str, Any]]:
         """
         Get recent conversation history for context.
@@ -446,6 +464,7 @@ class MemoryStore:
         conversations = user_memory.get("conversation_history") or user_memory.get("conversations", [])
         return conversations[-limit:] if conversations else []
     
+    @_synchronized
     def update_preference(self, user_number: str, key: str, value: Any) -> None:
         """
         Update user preference.
@@ -461,6 +480,7 @@ class MemoryStore:
         user_memory["last_interaction"] = datetime.now().isoformat()
         self._save_memory()
     
+    @_synchronized
     def update_preferences(self, user_number: str, prefs: Dict[str, Any]) -> None:
         """
         Update multiple user preferences at once.
@@ -475,6 +495,7 @@ class MemoryStore:
         user_memory["last_interaction"] = datetime.now().isoformat()
         self._save_memory()
     
+    @_synchronized
     def get_preference(self, user_number: str, key: str, default: Any = None) -> Any:
         """
         Get user preference.
@@ -490,6 +511,7 @@ class MemoryStore:
         user_memory = self.get_user_memory(user_number)
         return user_memory.get("preferences", {}).get(key, default)
     
+    @_synchronized
     def add_tracked_product(self, user_number: str, product_data: Dict[str, Any]) -> str:
         """
         Add a tracked product for a user.
@@ -520,6 +542,7 @@ class MemoryStore:
         
         return product_data.get("id", "")
     
+    @_synchronized
     def get_tracked_products(self, user_number: str) -> List[Dict[str, Any]]:
         """
         Get all tracked products for a user.
@@ -534,6 +557,7 @@ class MemoryStore:
         # Support both old and new format
         return user_memory.get("tracked_products") or user_memory.get("tracked_items", [])
     
+    @_synchronized
     def update_tracked_product(self, user_number: str, product_id: str, updates: Dict[str, Any]) -> bool:
         """
         Update a tracked product.
@@ -568,6 +592,7 @@ class MemoryStore:
         
         return False
     
+    @_synchronized
     def remove_tracked_product(self, user_number: str, product_id: str) -> bool:
         """
         Remove a tracked product.
@@ -601,6 +626,7 @@ class MemoryStore:
         
         return False
     
+    @_synchronized
     def add_reminder(self, user_number: str, reminder_data: Dict[str, Any]) -> str:
         """
         Add a reminder for a user.
@@ -630,6 +656,7 @@ class MemoryStore:
         
         return reminder_data.get("id", "")
     
+    @_synchronized
     def get_reminders(self, user_number: str, status: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Get reminders for a user.
@@ -649,6 +676,7 @@ class MemoryStore:
         
         return reminders
     
+    @_synchronized
     def cleanup_old_conversations(self, hours: int = 24) -> Dict[str, Any]:
         """
         Clean up conversations older than specified hours for all users.
@@ -709,6 +737,7 @@ class MemoryStore:
             "cutoff_time": cutoff_time.isoformat()
         }
     
+    @_synchronized
     def get_all_pending_reminders(self) -> List[Dict[str, Any]]:
         """
         Get all pending reminders across all users.
@@ -739,6 +768,7 @@ class MemoryStore:
         logger.debug(f"🔍 Total pending reminders found: {len(all_reminders)}")
         return all_reminders
     
+    @_synchronized
     def update_reminder(self, user_number: str, reminder_id: str, updates: Dict[str, Any]) -> bool:
         """
         Update a reminder.
@@ -764,6 +794,7 @@ class MemoryStore:
         
         return False
     
+    @_synchronized
     def cancel_reminder(self, user_number: str, reminder_id: str) -> bool:
         """
         Cancel a reminder.
@@ -781,6 +812,7 @@ class MemoryStore:
         """Explicitly load memory from disk (Phase 6 compatibility)."""
         self._load_memory()
     
+    @_synchronized
     def save(self) -> None:
         """Explicitly save memory to disk."""
         self._save_memory()
@@ -30,8 +30,31 @@ class MetaWhatsAppClient:
             raise ValueError("META_ACCESS_TOKEN and PHONE_NUMBER_ID must be set")
         
         self.api_url = f"{self.BASE_URL}/{self.phone_number_id}/messages"
+        
+        # Created on first use and reused, so sends share kept-alive connections
+        # instead of paying a TLS handshake per message
+        self._http_client: Optional[httpx.AsyncClient] = None
         logger.info("✅ Meta WhatsApp client initialized")
     
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Get the shared HTTP client for Graph API requests."""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=30.0,
+                headers={
+                    "Authorization": f"Bearer {self.access_token}",
+                    "Content-Type": "application/json"
+                },
+                limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60.0)
+            )
+        return self._http_client
+    
+    async def close(self) -> None:
+        """Close the shared HTTP client (called on shutdown)."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+    
     async def send_message(
         self,
         to: str,
@@ -80,29 +103,19 @@ class MetaWhatsAppClient:
                 }
             
             # Send request to Meta API
-            headers = {
-                "Authorization": f"Bearer {self.access_token}",
-                "Content-Type": "application/json"
-            }
+            response = await self._get_http_client().post(self.api_url, json=payload)
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=headers,
-                    json=payload
-                )
-                
-                response.raise_for_status()
-                result = response.json()
+            response.raise_for_status()
+            result = response.json()
+            
+            if "messages" in result and len(result["messages"]) > 0:
+                message_id = result["messages"][0]["id"]
+                logger.info(f"✅ Message sent successfully. Message ID: {message_id}")
+                return True
+            else:
+                logger.error(f"❌ Unexpected response format: {result}")
+                return False
                 
-                if "messages" in result and len(result["messages"]) > 0:
-                    message_id = result["messages"][0]["id"]
-                    logger.info(f"✅ Message sent successfully. Message ID: {message_id}")
-                    return True
-                else:
-                    logger.error(f"❌ Unexpected response format: {result}")
-                    return False
-                    
         except httpx.HTTPStatusError as e:
             error_detail = "Unknown error"
             try:
@@ -119,6 +132,37 @@ class MetaWhatsAppClient:
             logger.error(f"❌ Failed to send Meta WhatsApp message: {e}", exc_info=True)
             return False
     
+    async def send_typing_indicator(self, message_id: str) -> bool:
+        """
+        Mark an incoming message as read and show the "typing..." indicator.
+        
+        The indicator is dismissed when the reply is delivered (or after 25 seconds),
+        so the user sees activity while the response is still being generated.
+        
+        Args:
+            message_id: ID of the incoming message being replied to
+            
+        Returns:
+            True if the indicator was accepted, False otherwise
+        """
+        payload = {
+            "messaging_product": "whatsapp",
+            "status": "read",
+            "message_id": message_id,
+            "typing_indicator": {
+                "type": "text"
+            }
+        }
+        
+        try:
+            response = await self._get_http_client().post(self.api_url, json=payload, timeout=10.0)
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            # Cosmetic only - never let this hold up the actual reply
+            logger.debug(f"Could not send typing indicator for {message_id}: {e}")
+            return False
+    
     def verify_webhook(self, request: Request) -> bool:
         """
         Verify webhook request from Meta (for webhook setup).
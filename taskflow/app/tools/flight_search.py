@@ -6,28 +6,38 @@ Enhanced with accurate date tracking and parsing.
 import asyncio
 import json
 import logging
+import re
 from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
-import pytz
-
-try:
-    import google.generativeai as genai
-    from google.generativeai.types import HarmCategory, HarmBlockThreshold
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-    genai = None
-    HarmCategory = None
-    HarmBlockThreshold = None
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 
 import httpx
 
 from ..config import settings
+from ..utils.gemini import generate_content, get_gemini_model
 
 logger = logging.getLogger("taskflow")
 
 # IST timezone for accurate date tracking
-IST = pytz.timezone('Asia/Kolkata')
+IST = ZoneInfo('Asia/Kolkata')
+
+# Static instructions first and the city last, so every lookup shares the same prompt prefix
+_AIRPORT_CODE_PROMPT = """Convert a city name to its IATA airport code (3-letter uppercase code).
+
+Examples:
+- "Chennai" -> "MAA"
+- "Mumbai" -> "BOM"
+- "Delhi" -> "DEL"
+- "Bagdogra" -> "IXB"
+- "New York" -> "JFK"
+- "London" -> "LHR"
+
+Respond with ONLY the 3-letter uppercase airport code, nothing else. If you cannot find the airport code, respond with "null".
+
+City: """
+
+# A 3-letter code somewhere in a chattier reply
+_IATA_CODE_RE = re.compile(r'\b([A-Z]{3})\b')
 
 
 class FlightSearchTool:
@@ -40,40 +50,9 @@ class FlightSearchTool:
     def __init__(self):
         """Initialize the flight search tool."""
         self.cache: Dict[str, Dict[str, Any]] = {}
-        self.gemini_model = None
         
-        # Initialize Gemini for date parsing if available
-        if GEMINI_AVAILABLE and settings.GEMINI_API_KEY:
-            try:
-                genai.configure(api_key=settings.GEMINI_API_KEY)
-                # Try available models in order of preference
-                model_names = ["gemini-2.0-flash", "gemini-2.5-flash", "gemini-flash-latest", "gemini-pro-latest"]
-                self.gemini_model = None
-                
-                for model_name in model_names:
-                    try:
-                        self.gemini_model = genai.GenerativeModel(
-                            model_name=model_name,
-                            safety_settings={
-                                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                            }
-                        )
-                        logger.debug(f"Gemini model initialized for flight search with {model_name}")
-                        break
-                    except Exception as model_error:
-                        logger.debug(f"Failed to initialize with {model_name}: {model_error}")
-                        continue
-                
-                if not self.gemini_model:
-                    logger.warning(f"Failed to initialize Gemini for flight search with any model")
-            except Exception as e:
-                logger.warning(f"Failed to initialize Gemini for flight search: {e}")
-                self.gemini_model = None
-        else:
-            self.gemini_model = None
+        # Shared Gemini model for date parsing (None if unavailable)
+        self.gemini_model = get_gemini_model()
     
     async def search(
         self,
@@ -285,8 +264,8 @@ class FlightSearchTool:
         
         try:
             # Get current date/time in IST (accurate tracking)
-            now_ist = datetime.now(IST)
-            now_utc = datetime.now(pytz.UTC)
+            now_utc = datetime.now(timezone.utc)
+            now_ist = now_utc.astimezone(IST)
             
             # Build comprehensive date context (like we did for time tracking)
             current_date_info = f"""Current Date and Time Information (CRITICAL - Use this for date parsing):
@@ -328,7 +307,7 @@ CRITICAL: Use the exact current date ({now_ist.strftime('%Y-%m-%d')}) shown abov
 
 Respond with ONLY the date in YYYY-MM-DD format, nothing else. If you cannot parse it, respond with "null"."""
             
-            response = self.gemini_model.generate_content(prompt)
+            response = await generate_content(self.gemini_model, prompt)
             result = response.text.strip()
             
             # Validate the result
@@ -379,21 +358,9 @@ Respond with ONLY the date in YYYY-MM-DD format, nothing else. If you cannot par
             return None
         
         try:
-            prompt = f"""Convert this city name to its IATA airport code (3-letter uppercase code).
-
-City: "{city_name}"
-
-Examples:
-- "Chennai" -> "MAA"
-- "Mumbai" -> "BOM"
-- "Delhi" -> "DEL"
-- "Bagdogra" -> "IXB"
-- "New York" -> "JFK"
-- "London" -> "LHR"
-
-Respond with ONLY the 3-letter uppercase airport code, nothing else. If you cannot find the airport code, respond with "null"."""
+            prompt = f'{_AIRPORT_CODE_PROMPT}"{city_name}"'
             
-            response = self.gemini_model.generate_content(prompt)
+            response = await generate_content(self.gemini_model, prompt, cache_key="airport_code")
             code = response.text.strip().upper()
             
             # Validate it's a 3-letter code
@@ -405,8 +372,7 @@ Respond with ONLY the 3-letter uppercase airport code, nothing else. If you cann
                 return None
             else:
                 # Try to extract 3-letter code from response
-                import re
-                match = re.search(r'\b([A-Z]{3})\b', code)
+                match = _IATA_CODE_RE.search(code)
                 if match:
                     return match.group(1)
                 logger.warning(f"⚠️  Invalid airport code format for '{city_name}': {code}")
@@ -5,6 +5,7 @@ This is extracted as a separate method for the price tracker.
 import logging
 import asyncio
 import json
+import re
 from typing import Optional, Dict, Any, List
 
 logger = logging.getLogger("taskflow")
@@ -16,12 +17,23 @@ except ImportError:
     SERPAPI_AVAILABLE = False
     GoogleSearch = None
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-    genai = None
+from ..utils.gemini import generate_content
+
+# Price parsing patterns, compiled once
+_PRICE_NUMBER_RE = re.compile(r'(\d+\.?\d*)')
+_NON_NUMERIC_RE = re.compile(r'[^\d.]')
+
+# Static instructions first and the product data last, so every extraction shares the same prompt prefix
+_PRICE_EXTRACTION_PROMPT = """Extract the price from the product data below. Return ONLY the numeric price value (without currency symbols or commas).
+
+Instructions:
+- Look for price, extracted_price, or any price-related fields
+- Convert to a single numeric value (e.g., "₹50,000" -> 50000)
+- If you find the price, respond with ONLY the number (e.g., "50000" or "50000.99")
+- If no price found, respond with "null"
+
+Product data:
+"""
 
 
 async def search_product_price_with_serpapi(
@@ -61,11 +73,10 @@ async def search_product_price_with_serpapi(
         }
         
         # Run search in thread pool (SerpAPI is synchronous)
-        loop = asyncio.get_event_loop()
-        search = await loop.run_in_executor(None, lambda: GoogleSearch(params))
-        results = await loop.run_in_executor(None, search.get_dict)
+        results = await asyncio.to_thread(lambda: GoogleSearch(params).get_dict())
         
-        logger.debug(f"SerpAPI raw results: {json.dumps(results, indent=2)[:500]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("SerpAPI raw results: %s", json.dumps(results, indent=2)[:500])
         
         # Extract shopping results
         shopping_results = results.get("shopping_results", [])
@@ -136,15 +147,13 @@ def parse_price_from_string(price_str: str) -> Optional[float]:
         "50000" -> 50000.0
         "Rs. 1,50,000" -> 150000.0
     """
-    import re
-    
     try:
         # Remove currency symbols and text
         price_str = price_str.replace('₹', '').replace('$', '').replace('Rs', '').replace('INR', '')
         price_str = price_str.replace(',', '').strip()
         
         # Extract first number found
-        match = re.search(r'(\d+\.?\d*)', price_str)
+        match = _PRICE_NUMBER_RE.search(price_str)
         if match:
             return float(match.group(1))
         
@@ -165,20 +174,10 @@ async def extract_price_with_gemini(product_data: Dict[str, Any], gemini_model:
         Extracted price or None
     """
     try:
-        prompt = f"""Extract the price from this product data. Return ONLY the numeric price value (without currency symbols or commas).
-
-Product data:
-{json.dumps(product_data, indent=2)}
-
-Instructions:
-- Look for price, extracted_price, or any price-related fields
-- Convert to a single numeric value (e.g., "₹50,000" -> 50000)
-- If you find the price, respond with ONLY the number (e.g., "50000" or "50000.99")
-- If no price found, respond with "null"
-
-Your response (numeric price only):"""
+        prompt = f"{_PRICE_EXTRACTION_PROMPT}{json.dumps(product_data, ensure_ascii=False)}\n\nYour response (numeric price only):"
         
-        response = await asyncio.to_thread(gemini_model.generate_content, prompt)
+        # Same product data always yields the same price, so the prompt is cacheable
+        response = await generate_content(gemini_model, prompt, cache_key="price_extraction")
         
         if response and response.text:
             result = response.text.strip()
@@ -188,8 +187,7 @@ Your response (numeric price only):"""
                 if result.lower() == "null":
                     return None
                 # Remove any remaining non-numeric characters except decimal point
-                import re
-                numeric_str = re.sub(r'[^\d.]', '', result)
+                numeric_str = _NON_NUMERIC_RE.sub('', result)
                 return float(numeric_str)
             except:
                 return None
@@ -28,13 +28,6 @@ except ImportError:
     BEAUTIFULSOUP_AVAILABLE = False
     BeautifulSoup = None
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-    genai = None
-
 try:
     from serpapi import GoogleSearch
     SERPAPI_AVAILABLE = True
@@ -46,9 +39,19 @@ import httpx
 
 from ..config import settings
 from ..memory import MemoryStore
+from ..utils.gemini import GEMINI_AVAILABLE, configure_gemini, generate_content
 
 logger = logging.getLogger("taskflow")
 
+# Tracked items scraped at once during a price refresh (each may open a browser page)
+PRICE_CHECK_CONCURRENCY = 3
+
+# Price parsing patterns, compiled once
+_NON_NUMERIC_RE = re.compile(r'[^\d.]')
+_CURRENCY_RE = re.compile(r'[₹$€£,\s]')
+_PRICE_NUMBER_RE = re.compile(r'(\d+\.?\d*)')
+_INTEGER_RE = re.compile(r'(\d+)')
+
 
 class PriceTrackerTool:
     """Tool for tracking product prices using web scraping."""
@@ -63,12 +66,13 @@ class PriceTrackerTool:
         self.memory_store = memory_store or MemoryStore()
         self.browser: Optional[Browser] = None
         self._playwright = None
+        self._browser_lock = asyncio.Lock()
         
         # Initialize Gemini model for intelligent product selection
         self.gemini_model = None
-        if GEMINI_AVAILABLE:
+        if GEMINI_AVAILABLE and settings.GEMINI_API_KEY:
             try:
-                genai.configure(api_key=settings.GEMINI_API_KEY)
+                genai = configure_gemini()
                 self.gemini_model = genai.GenerativeModel('gemini-2.0-flash-exp')
                 logger.info("✅ Gemini model initialized for price tracker")
             except Exception as e:
@@ -86,13 +90,15 @@ class PriceTrackerTool:
         if not PLAYWRIGHT_AVAILABLE:
             raise Exception("Playwright is not installed. Please install it with: pip install playwright && playwright install")
         
-        if self.browser is None:
-            self._playwright = await async_playwright().start()
-            self.browser = await self._playwright.chromium.launch(
-                headless=True,
-                args=['--no-sandbox', '--disable-setuid-sandbox']
-            )
-            logger.debug("Browser initialized for price tracking")
+        # Concurrent scrapes share one browser; only the first launches it
+        async with self._browser_lock:
+            if self.browser is None:
+                self._playwright = await async_playwright().start()
+                self.browser = await self._playwright.chromium.launch(
+                    headless=True,
+                    args=['--no-sandbox', '--disable-setuid-sandbox']
+                )
+                logger.debug("Browser initialized for price tracking")
         
         return self.browser
     
@@ -183,7 +189,7 @@ class PriceTrackerTool:
             product_data["url"] = product_data.get("url", url)
             
             # Save to memory
-            self.memory_store.add_tracked_product(user_number, product_data)
+            await asyncio.to_thread(self.memory_store.add_tracked_product, user_number, product_data)
             
             # Format response
             price_str = f"₹{product_data.get('current_price', 0):,.0f}" if product_data.get('current_price') else "N/A"
@@ -197,7 +203,7 @@ class PriceTrackerTool:
             if target_price:
                 response += f"📉 I'll alert you if price drops below {target_str}\n"
             
-            tracked_count = len(self.memory_store.get_tracked_products(user_number))
+            tracked_count = len(await asyncio.to_thread(self.memory_store.get_tracked_products, user_number))
             response += f"\nYou're tracking {tracked_count} item(s) total."
             
             return {
@@ -228,7 +234,8 @@ class PriceTrackerTool:
         logger.info(f"Getting tracked items for {user_number}")
         
         try:
-            items = self.memory_store.get_tracked_products(user_number)
+            # Read off the event loop so a status check can fetch reminders at the same time
+            items = await asyncio.to_thread(self.memory_store.get_tracked_products, user_number)
             
             if not items:
                 return {
@@ -252,13 +259,13 @@ class PriceTrackerTool:
                 })
             
             # Build response message
-            message = f"📦 You're tracking {len(items)} item(s):\n\n"
-            for i, item in enumerate(formatted_items, 1):
-                message += f"{i}. {item['title']}\n"
-                message += f"   💰 {item['price']}\n"
-                if item.get('target_price'):
-                    message += f"   📉 Alert if below ₹{item['target_price']:,.0f}\n"
-                message += "\n"
+            message = f"📦 You're tracking {len(items)} item(s):\n\n" + "".join(
+                f"{i}. {item['title']}\n"
+                f"   💰 {item['price']}\n"
+                + (f"   📉 Alert if below ₹{item['target_price']:,.0f}\n" if item.get('target_price') else "")
+                + "\n"
+                for i, item in enumerate(formatted_items, 1)
+            )
             
             return {
                 "success": True,
@@ -290,7 +297,7 @@ class PriceTrackerTool:
         logger.info(f"Stop tracking requested for {user_number}: {product_id or product_name}")
         
         try:
-            items = self.memory_store.get_tracked_products(user_number)
+            items = await asyncio.to_thread(self.memory_store.get_tracked_products, user_number)
             
             if not items:
                 return {
@@ -320,7 +327,7 @@ class PriceTrackerTool:
                 }
             
             # Remove product
-            removed = self.memory_store.remove_tracked_product(user_number, product_to_remove.get("id"))
+            removed = await asyncio.to_thread(self.memory_store.remove_tracked_product, user_number, product_to_remove.get("id"))
             
             if removed:
                 return {
@@ -365,7 +372,7 @@ class PriceTrackerTool:
         try:
             # Get all tracked items (or for specific user)
             if user_number:
-                items = self.memory_store.get_tracked_products(user_number)
+                items = await asyncio.to_thread(self.memory_store.get_tracked_products, user_number)
             else:
                 # Get all users' tracked items (for background job)
                 all_items = []
@@ -379,21 +386,24 @@ class PriceTrackerTool:
                     "tool": "price_tracker"
                 }
             
-            # Check prices for each item
-            updates = []
-            for item in items:
+            # Items are independent, so scrape a few at a time rather than one after another
+            semaphore = asyncio.Semaphore(PRICE_CHECK_CONCURRENCY)
+            
+            async def check_item(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
                 try:
                     url = item.get("url")
                     if not url:
-                        continue
+                        return None
                     
-                    product_data = await self._scrape_product(url)
+                    async with semaphore:
+                        product_data = await self._scrape_product(url)
                     if product_data and product_data.get("current_price"):
                         old_price = item.get("current_price", 0)
                         new_price = product_data.get("current_price", 0)
                         
                         # Update in memory
-                        self.memory_store.update_tracked_product(
+                        await asyncio.to_thread(
+                            self.memory_store.update_tracked_product,
                             user_number or item.get("user_number", ""),
                             item.get("id"),
                             {
@@ -402,16 +412,19 @@ class PriceTrackerTool:
                             }
                         )
                         
-                        updates.append({
+                        return {
                             "product": item.get("title"),
                             "old_price": old_price,
                             "new_price": new_price,
                             "dropped": new_price < old_price if old_price else False
-                        })
+                        }
                         
                 except Exception as e:
                     logger.warning(f"Error checking price for {item.get('title')}: {e}")
-                    continue
+                return None
+            
+            results = await asyncio.gather(*(check_item(item) for item in items))
+            updates = [update for update in results if update is not None]
             
             return {
                 "success": True,
@@ -460,8 +473,8 @@ class PriceTrackerTool:
             }
             logger.info(f"📡 Calling SerpAPI Google Shopping with query: '{product_name}'")
             
-            search = GoogleSearch(search_params)
-            results = search.get_dict()
+            # The SerpAPI client is a blocking HTTP call; keep it off the event loop
+            results = await asyncio.to_thread(lambda: GoogleSearch(search_params).get_dict())
             
             logger.info(f"📦 SerpAPI response keys: {list(results.keys())}")
             shopping_results = results.get("shopping_results", [])
@@ -513,7 +526,7 @@ class PriceTrackerTool:
                     price = float(price_str)
                 else:
                     # Remove currency symbols and commas
-                    price = float(re.sub(r'[^\d.]', '', str(price_str)))
+                    price = float(_NON_NUMERIC_RE.sub('', str(price_str)))
             except:
                 price = 0.0
                 logger.warning(f"⚠️  Could not parse price: {price_str}")
@@ -544,19 +557,19 @@ class PriceTrackerTool:
         """Use Gemini to intelligently select the best matching product."""
         try:
             # Prepare results for Gemini
-            results_text = []
-            for i, result in enumerate(results):
-                title = result.get("title", "Unknown")
-                price = result.get("extracted_price") or result.get("price", "N/A")
-                source = result.get("source", "Unknown")
-                rating = result.get("rating", "N/A")
-                results_text.append(f"{i+1}. {title}\n   Price: {price}\n   Source: {source}\n   Rating: {rating}")
+            results_text = "\n".join(
+                f"{i}. {result.get('title', 'Unknown')}\n"
+                f"   Price: {result.get('extracted_price') or result.get('price', 'N/A')}\n"
+                f"   Source: {result.get('source', 'Unknown')}\n"
+                f"   Rating: {result.get('rating', 'N/A')}"
+                for i, result in enumerate(results, 1)
+            )
             
             prompt = f"""User is searching for: "{query}"
 
 Here are the top product results:
 
-{chr(10).join(results_text)}
+{results_text}
 
 Which result is the BEST match for what the user is looking for?
 Consider:
@@ -567,11 +580,11 @@ Consider:
 
 Respond with ONLY the number (1-{len(results)}) of the best match. Just the number, nothing else."""
 
-            response = self.gemini_model.generate_content(prompt)
+            response = await generate_content(self.gemini_model, prompt)
             response_text = response.text.strip()
             
             # Extract number
-            match = re.search(r'(\d+)', response_text)
+            match = _INTEGER_RE.search(response_text)
             if match:
                 index = int(match.group(1)) - 1
                 if 0 <= index < len(results):
@@ -874,10 +887,10 @@ Respond with ONLY the number (1-{len(results)}) of the best match. Just the numb
             return None
         
         # Remove currency symbols and whitespace
-        price_clean = re.sub(r'[₹$€£,\s]', '', price_text.strip())
+        price_clean = _CURRENCY_RE.sub('', price_text.strip())
         
         # Extract numbers (including decimals)
-        price_match = re.search(r'(\d+\.?\d*)', price_clean)
+        price_match = _PRICE_NUMBER_RE.search(price_clean)
         if price_match:
             try:
                 return float(price_match.group(1))
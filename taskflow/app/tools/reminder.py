@@ -7,17 +7,7 @@ import logging
 import uuid
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
-import pytz
-
-try:
-    import google.generativeai as genai
-    from google.generativeai.types import HarmCategory, HarmBlockThreshold
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-    genai = None
-    HarmCategory = None
-    HarmBlockThreshold = None
+from zoneinfo import ZoneInfo
 
 try:
     import dateparser
@@ -26,13 +16,53 @@ except ImportError:
     DATEPARSER_AVAILABLE = False
     dateparser = None
 
-from ..config import settings
 from ..memory import MemoryStore
+from ..utils.gemini import generate_content, get_gemini_model
 
 logger = logging.getLogger("taskflow")
 
 # IST timezone
-IST = pytz.timezone('Asia/Kolkata')
+IST = ZoneInfo('Asia/Kolkata')
+UTC = ZoneInfo('UTC')
+
+# Set whenever a reminder is added or cancelled, so the reminder scheduler rebuilds
+# its schedule right away instead of at its next due time or resync
+reminders_changed = asyncio.Event()
+
+# Common country to timezone mappings
+_COUNTRY_TIMEZONES = {
+    "india": "Asia/Kolkata",
+    "nepal": "Asia/Kathmandu",
+    "usa": "America/New_York",
+    "united states": "America/New_York",
+    "uk": "Europe/London",
+    "united kingdom": "Europe/London",
+    "canada": "America/Toronto",
+    "australia": "Australia/Sydney",
+    "germany": "Europe/Berlin",
+    "france": "Europe/Paris",
+    "japan": "Asia/Tokyo",
+    "china": "Asia/Shanghai",
+    "singapore": "Asia/Singapore",
+    "uae": "Asia/Dubai",
+    "united arab emirates": "Asia/Dubai",
+    "saudi arabia": "Asia/Riyadh",
+}
+# Common city mappings (tried when the country is unknown)
+_CITY_TIMEZONES = {
+    "mumbai": "Asia/Kolkata",
+    "delhi": "Asia/Kolkata",
+    "bangalore": "Asia/Kolkata",
+    "chennai": "Asia/Kolkata",
+    "kolkata": "Asia/Kolkata",
+    "kathmandu": "Asia/Kathmandu",
+    "new york": "America/New_York",
+    "los angeles": "America/Los_Angeles",
+    "london": "Europe/London",
+    "toronto": "America/Toronto",
+    "sydney": "Australia/Sydney",
+    "tokyo": "Asia/Tokyo",
+}
 
 
 class ReminderTool:
@@ -46,38 +76,9 @@ class ReminderTool:
             memory_store: MemoryStore instance for persisting reminders
         """
         self.memory_store = memory_store or MemoryStore()
-        self.gemini_model = None
         
-        # Initialize Gemini for datetime parsing if available
-        if GEMINI_AVAILABLE and settings.GEMINI_API_KEY:
-            try:
-                genai.configure(api_key=settings.GEMINI_API_KEY)
-                # Try available models in order of preference
-                model_names = ["gemini-2.0-flash", "gemini-2.5-flash", "gemini-flash-latest", "gemini-pro-latest"]
-                self.gemini_model = None
-                
-                for model_name in model_names:
-                    try:
-                        self.gemini_model = genai.GenerativeModel(
-                            model_name=model_name,
-                            safety_settings={
-                                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                            }
-                        )
-                        logger.debug(f"Gemini model initialized for reminders with {model_name}")
-                        break
-                    except Exception as model_error:
-                        logger.debug(f"Failed to initialize with {model_name}: {model_error}")
-                        continue
-                
-                if not self.gemini_model:
-                    logger.warning(f"Failed to initialize Gemini for reminders with any model")
-            except Exception as e:
-                logger.warning(f"Failed to initialize Gemini for reminders: {e}")
-                self.gemini_model = None
+        # Shared Gemini model for datetime parsing (None if unavailable)
+        self.gemini_model = get_gemini_model()
     
     async def set_reminder(
         self,
@@ -159,6 +160,8 @@ class ReminderTool:
                 "id": reminder_id,
                 "task": message,
                 "datetime": parsed_datetime.isoformat(),
+                # Epoch seconds of the due time, so the scheduler needn't parse "datetime"
+                "due_epoch": parsed_datetime.timestamp(),
                 "timezone": str(user_timezone),
                 "country": country,
                 "location": location,
@@ -167,11 +170,12 @@ class ReminderTool:
             }
             
             # Save to memory
-            self.memory_store.add_reminder(user_number, reminder_data)
+            await asyncio.to_thread(self.memory_store.add_reminder, user_number, reminder_data)
+            reminders_changed.set()
             
             # Format response
             datetime_display = parsed_datetime.strftime("%b %d, %Y at %I:%M %p")
-            active_count = len(self.memory_store.get_reminders(user_number, status="pending"))
+            active_count = len(await asyncio.to_thread(self.memory_store.get_reminders, user_number, status="pending"))
             
             timezone_display = country or location or "your timezone"
             response = (
@@ -209,7 +213,8 @@ class ReminderTool:
         logger.info(f"Getting reminders for {user_number}")
         
         try:
-            reminders = self.memory_store.get_reminders(user_number, status="pending")
+            # Read off the event loop so a status check can fetch tracked items at the same time
+            reminders = await asyncio.to_thread(self.memory_store.get_reminders, user_number, status="pending")
             
             if not reminders:
                 return {
@@ -225,13 +230,15 @@ class ReminderTool:
             # Format reminders for display
             formatted_reminders = []
             for i, reminder in enumerate(reminders, 1):
+                # Only parsing the stored value can fail; formatting a parsed datetime can't
                 try:
                     reminder_dt = datetime.fromisoformat(reminder.get("datetime", ""))
+                except (TypeError, ValueError):
+                    datetime_display = reminder.get("datetime", "Unknown")
+                else:
                     if reminder_dt.tzinfo is None:
-                        reminder_dt = IST.localize(reminder_dt)
+                        reminder_dt = reminder_dt.replace(tzinfo=IST)
                     datetime_display = reminder_dt.strftime("%b %d, %Y at %I:%M %p")
-                except:
-                    datetime_display = reminder.get("datetime", "Unknown")
                 
                 formatted_reminders.append({
                     "id": reminder.get("id"),
@@ -242,10 +249,11 @@ class ReminderTool:
                 })
             
             # Build response message
-            message = f"📋 You have {len(reminders)} active reminder(s):\n\n"
-            for reminder in formatted_reminders:
-                message += f"{reminder['number']}. 📝 {reminder['task']}\n"
-                message += f"   📅 {reminder['datetime']}\n\n"
+            message = f"📋 You have {len(reminders)} active reminder(s):\n\n" + "".join(
+                f"{reminder['number']}. 📝 {reminder['task']}\n"
+                f"   📅 {reminder['datetime']}\n\n"
+                for reminder in formatted_reminders
+            )
             
             return {
                 "success": True,
@@ -282,7 +290,7 @@ class ReminderTool:
         logger.info(f"Cancel reminder requested for {user_number}: {reminder_id or reminder_number}")
         
         try:
-            reminders = self.memory_store.get_reminders(user_number, status="pending")
+            reminders = await asyncio.to_thread(self.memory_store.get_reminders, user_number, status="pending")
             
             if not reminders:
                 return {
@@ -311,11 +319,12 @@ class ReminderTool:
                 }
             
             # Cancel reminder
-            cancelled = self.memory_store.cancel_reminder(user_number, reminder_to_cancel.get("id"))
+            cancelled = await asyncio.to_thread(self.memory_store.cancel_reminder, user_number, reminder_to_cancel.get("id"))
             
             if cancelled:
+                reminders_changed.set()
                 task = reminder_to_cancel.get("task", "Reminder")
-                active_count = len(self.memory_store.get_reminders(user_number, status="pending"))
+                active_count = len(await asyncio.to_thread(self.memory_store.get_reminders, user_number, status="pending"))
                 
                 return {
                     "success": True,
@@ -337,7 +346,7 @@ class ReminderTool:
                 "tool": "reminder"
             }
     
-    def _get_timezone_from_country(self, country: Optional[str], location: Optional[str]) -> pytz.timezone:
+    def _get_timezone_from_country(self, country: Optional[str], location: Optional[str]) -> ZoneInfo:
         """
         Get timezone from country or location.
         
@@ -346,60 +355,25 @@ class ReminderTool:
             location: City/location name
             
         Returns:
-            pytz timezone object (defaults to IST if not found)
+            ZoneInfo timezone (defaults to IST if not found)
         """
-        # Common country to timezone mappings
-        country_timezones = {
-            "india": "Asia/Kolkata",
-            "nepal": "Asia/Kathmandu",
-            "usa": "America/New_York",
-            "united states": "America/New_York",
-            "uk": "Europe/London",
-            "united kingdom": "Europe/London",
-            "canada": "America/Toronto",
-            "australia": "Australia/Sydney",
-            "germany": "Europe/Berlin",
-            "france": "Europe/Paris",
-            "japan": "Asia/Tokyo",
-            "china": "Asia/Shanghai",
-            "singapore": "Asia/Singapore",
-            "uae": "Asia/Dubai",
-            "united arab emirates": "Asia/Dubai",
-            "saudi arabia": "Asia/Riyadh",
-        }
-        
         # Try country first
         if country:
             country_lower = country.lower().strip()
-            if country_lower in country_timezones:
-                return pytz.timezone(country_timezones[country_lower])
+            if country_lower in _COUNTRY_TIMEZONES:
+                return ZoneInfo(_COUNTRY_TIMEZONES[country_lower])
         
         # Try location/city (common cities)
         if location:
             location_lower = location.lower().strip()
-            # Common city mappings
-            city_timezones = {
-                "mumbai": "Asia/Kolkata",
-                "delhi": "Asia/Kolkata",
-                "bangalore": "Asia/Kolkata",
-                "chennai": "Asia/Kolkata",
-                "kolkata": "Asia/Kolkata",
-                "kathmandu": "Asia/Kathmandu",
-                "new york": "America/New_York",
-                "los angeles": "America/Los_Angeles",
-                "london": "Europe/London",
-                "toronto": "America/Toronto",
-                "sydney": "Australia/Sydney",
-                "tokyo": "Asia/Tokyo",
-            }
-            if location_lower in city_timezones:
-                return pytz.timezone(city_timezones[location_lower])
+            if location_lower in _CITY_TIMEZONES:
+                return ZoneInfo(_CITY_TIMEZONES[location_lower])
         
         # Default to IST
         logger.warning(f"Could not determine timezone for country={country}, location={location}, defaulting to IST")
         return IST
     
-    async def _parse_datetime(self, datetime_str: str, timezone: Optional[pytz.timezone] = None) -> Optional[datetime]:
+    async def _parse_datetime(self, datetime_str: str, timezone: Optional[ZoneInfo] = None) -> Optional[datetime]:
         """
         Parse flexible datetime strings into datetime objects.
         Handles formats like "tomorrow at 3pm", "Dec 10 at 3pm", "in 2 hours", etc.
@@ -426,7 +400,7 @@ class ReminderTool:
                 if parsed:
                     # Ensure it's in the correct timezone
                     if parsed.tzinfo is None:
-                        parsed = timezone.localize(parsed)
+                        parsed = parsed.replace(tzinfo=timezone)
                     else:
                         parsed = parsed.astimezone(timezone)
                     return parsed
@@ -445,7 +419,7 @@ class ReminderTool:
         # Fallback: try simple patterns
         return self._parse_datetime_fallback(datetime_str, timezone)
     
-    async def _parse_datetime_with_gemini(self, datetime_str: str, timezone: Optional[pytz.timezone] = None) -> Optional[datetime]:
+    async def _parse_datetime_with_gemini(self, datetime_str: str, timezone: Optional[ZoneInfo] = None) -> Optional[datetime]:
         """
         Use Gemini to parse flexible datetime strings with accurate current time context.
         
@@ -462,8 +436,9 @@ class ReminderTool:
         if timezone is None:
             timezone = IST
         
-        now_tz = datetime.now(timezone)
-        now_utc = datetime.now(pytz.UTC)
+        # One clock read for both, so the two lines can't disagree
+        now_utc = datetime.now(UTC)
+        now_tz = now_utc.astimezone(timezone)
         
         # Build comprehensive datetime context (like we did for date/time tracking)
         current_datetime_info = f"""Current Date and Time Information (CRITICAL - Use this for datetime parsing):
@@ -510,7 +485,7 @@ CRITICAL:
 Respond with ONLY the ISO datetime string (YYYY-MM-DDTHH:MM:SS), nothing else. If you cannot parse it, respond with "null"."""
         
         try:
-            response = self.gemini_model.generate_content(prompt)
+            response = await generate_content(self.gemini_model, prompt)
             result = response.text.strip()
             
             if result.lower() == "null" or not result:
@@ -521,7 +496,7 @@ Respond with ONLY the ISO datetime string (YYYY-MM-DDTHH:MM:SS), nothing else. I
                 parsed = datetime.fromisoformat(result.replace('Z', '+00:00'))
                 # Convert to target timezone
                 if parsed.tzinfo is None:
-                    parsed = timezone.localize(parsed)
+                    parsed = parsed.replace(tzinfo=timezone)
                 else:
                     parsed = parsed.astimezone(timezone)
                 return parsed
@@ -532,7 +507,7 @@ Respond with ONLY the ISO datetime string (YYYY-MM-DDTHH:MM:SS), nothing else. I
             logger.warning(f"Gemini datetime parsing error: {e}")
             return None
     
-    def _parse_datetime_fallback(self, datetime_str: str, timezone: Optional[pytz.timezone] = None) -> Optional[datetime]:
+    def _parse_datetime_fallback(self, datetime_str: str, timezone: Optional[ZoneInfo] = None) -> Optional[datetime]:
         """
         Fallback datetime parsing using simple patterns.
         
@@ -577,7 +552,7 @@ Respond with ONLY the ISO datetime string (YYYY-MM-DDTHH:MM:SS), nothing else. I
             # Try ISO format
             parsed = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
             if parsed.tzinfo is None:
-                parsed = timezone.localize(parsed)
+                parsed = parsed.replace(tzinfo=timezone)
             else:
                 parsed = parsed.astimezone(timezone)
             return parsed
@@ -0,0 +1,416 @@
+"""
+Shared Gemini model setup for TaskFlow.
+The agent and the tools use the same model configuration, so the model is
+created once per process and reused.
+
+google.generativeai is heavy to import, so it is only imported once a model
+is actually needed (i.e. GEMINI_API_KEY is set); workers running on the
+keyword fallback never pay for it.
+"""
+import asyncio
+import contextlib
+import datetime
+import functools
+import importlib.util
+import logging
+import random
+from typing import Any, Dict, Optional
+
+from ..config import settings
+from .semantic_cache import ExactMatchCache
+
+logger = logging.getLogger("taskflow")
+
+# Checked without importing the package
+GEMINI_AVAILABLE = importlib.util.find_spec("google.generativeai") is not None
+
+# Models to try, in order of preference (settings.GEMINI_MODEL, if set, is tried first)
+GEMINI_MODEL_NAMES = ["gemini-2.0-flash", "gemini-2.5-flash", "gemini-flash-latest", "gemini-pro-latest"]
+
+
+# Upper bound for a single retry delay, in seconds (a server retry hint can ask for this much)
+MAX_RETRY_DELAY_SECONDS = 30.0
+# Upper bound for the jittered backoff when the server gives no hint
+MAX_BACKOFF_SECONDS = 8.0
+
+# Finish reasons for a reply Gemini withheld; the same prompt gets withheld again
+BLOCKED_FINISH_REASONS = frozenset({"SAFETY", "RECITATION", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII"})
+
+# Consecutive connection-level failures after which the async gRPC client is rebuilt
+CONNECTION_RESET_THRESHOLD = 3
+
+_connection_failures = 0
+
+# Bounds in-flight Gemini requests across the agent and all tools (created on first use)
+_gemini_semaphore: Optional[asyncio.Semaphore] = None
+
+# Responses for deterministic prompts, keyed on the exact model + prompt + config (created on first use)
+_prompt_cache: Optional[ExactMatchCache] = None
+
+
+class BlockedResponseError(Exception):
+    """Gemini returned no text because the prompt or the reply was blocked (not worth retrying)."""
+
+
+def gemini_semaphore() -> asyncio.Semaphore:
+    """
+    Get the shared semaphore limiting concurrent Gemini requests.
+    
+    Returns:
+        Semaphore sized by settings.GEMINI_MAX_CONCURRENCY
+    """
+    global _gemini_semaphore
+    if _gemini_semaphore is None:
+        _gemini_semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+    return _gemini_semaphore
+
+
+def _get_prompt_cache() -> ExactMatchCache:
+    """Get the shared prompt cache, sized from settings."""
+    global _prompt_cache
+    if _prompt_cache is None:
+        _prompt_cache = ExactMatchCache(
+            max_entries=settings.GEMINI_PROMPT_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.GEMINI_PROMPT_CACHE_TTL_SECONDS,
+            normalize=False
+        )
+    return _prompt_cache
+
+
+async def generate_content(
+    model: Any, prompt: str, cache_key: Optional[str] = None, timeout: Optional[float] = None, **kwargs
+) -> Any:
+    """
+    Call generate_content_async, bounded by the shared concurrency limit and timeout.
+    
+    Args:
+        model: GenerativeModel instance
+        prompt: Prompt to send
+        cache_key: Reuse the response for an identical earlier prompt sent with the
+            same cache_key. Name it after the call's generation config (kwargs aren't
+            part of the key, so they're never serialized per call). Only for prompts
+            whose answer doesn't depend on live data or the current time.
+        timeout: Seconds to wait for the response (defaults to GEMINI_TIMEOUT_SECONDS)
+        **kwargs: Extra arguments for generate_content_async (e.g. generation_config)
+        
+    Returns:
+        Gemini response
+    """
+    if cache_key is not None:
+        namespace = f"{getattr(model, 'model_name', '')}\0{cache_key}"
+        cached = _get_prompt_cache().get(namespace, prompt)
+        if cached is not None:
+            logger.debug("⚡ Gemini response served from prompt cache")
+            return cached
+    
+    async with gemini_semaphore():
+        with connection_health(model):
+            response = await asyncio.wait_for(
+                model.generate_content_async(prompt, **kwargs),
+                timeout=settings.GEMINI_TIMEOUT_SECONDS if timeout is None else timeout
+            )
+    
+    if cache_key is not None:
+        try:
+            has_text = bool(response.text)
+        except ValueError:
+            has_text = False
+        if has_text:
+            _get_prompt_cache().put(namespace, prompt, response)
+    
+    return response
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """Check whether a failed call points at a broken channel rather than a bad request."""
+    try:
+        from google.api_core import exceptions as google_exceptions
+    except ImportError:
+        return isinstance(error, ConnectionError)
+    return isinstance(error, (google_exceptions.ServiceUnavailable, ConnectionError))
+
+
+def _reset_async_client(model: Any) -> None:
+    """Drop the SDK's shared async client (and the model's handle on it) so the next call reconnects."""
+    from google.generativeai import client
+    client._client_manager.clients.pop("generative_async", None)
+    model._async_client = None
+
+
+@contextlib.contextmanager
+def connection_health(model: Any):
+    """
+    Track connection failures around a Gemini call.
+    
+    The async client keeps one gRPC channel open for every call. If that channel
+    goes bad, every request fails the same way, so after CONNECTION_RESET_THRESHOLD
+    consecutive connection errors the client is rebuilt.
+    
+    Args:
+        model: GenerativeModel the call is made with
+    """
+    global _connection_failures
+    try:
+        yield
+    except Exception as e:
+        if _is_connection_error(e):
+            _connection_failures += 1
+            if _connection_failures >= CONNECTION_RESET_THRESHOLD:
+                logger.warning(f"⚠️  {_connection_failures} Gemini connection errors in a row; reconnecting")
+                _connection_failures = 0
+                _reset_async_client(model)
+        raise
+    else:
+        _connection_failures = 0
+
+
+async def warm_up_gemini(model: Any) -> None:
+    """
+    Send a one-token request so the gRPC channel is connected before the first
+    user message arrives (called in the background at startup).
+    
+    Args:
+        model: GenerativeModel to warm up
+    """
+    try:
+        await generate_content(model, "ping", generation_config={"max_output_tokens": 1})
+        logger.info("✅ Gemini connection warmed up")
+    except Exception as e:
+        logger.debug(f"Gemini warm-up skipped: {e}")
+
+
+def response_text(response: Any) -> str:
+    """
+    Get the text of a non-streamed Gemini response.
+    
+    Args:
+        response: Gemini response
+        
+    Returns:
+        Response text (empty if the response is missing)
+        
+    Raises:
+        BlockedResponseError: If the prompt was blocked or the reply has no text
+            (e.g. it finished with SAFETY or RECITATION)
+    """
+    if not response:
+        return ""
+    try:
+        return response.text
+    except ValueError as e:
+        raise BlockedResponseError(f"Gemini returned no text: {e}") from e
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Check whether a failed Gemini call is worth retrying.
+    Rate limits (429), aborted requests (409), server errors and timeouts are;
+    other 4xx errors (invalid argument, permission denied, not found, ...) and
+    blocked responses will fail the same way again.
+    
+    Args:
+        error: Exception raised by the Gemini call
+        
+    Returns:
+        True if the call should be retried
+    """
+    if isinstance(error, BlockedResponseError):
+        return False
+    try:
+        from google.api_core import exceptions as google_exceptions
+    except ImportError:
+        return True
+    if isinstance(error, google_exceptions.ClientError):
+        return isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.Aborted))
+    return True
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Compute how long to wait before retrying a failed Gemini call.
+    
+    Uses full jitter (uniform between 0 and 2**attempt seconds, at most
+    MAX_BACKOFF_SECONDS) so concurrent callers that hit the same rate-limit window
+    don't retry in lockstep. If the error carries a server retry hint (RetryInfo),
+    waits at least that long.
+    
+    Args:
+        error: Exception raised by the Gemini call
+        attempt: Zero-based attempt number that just failed
+        
+    Returns:
+        Delay in seconds, capped at MAX_RETRY_DELAY_SECONDS
+    """
+    hinted = 0.0
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            hinted = max(hinted, delay.seconds + delay.nanos / 1e9)
+    
+    jittered = random.uniform(0, min(2 ** attempt, MAX_BACKOFF_SECONDS))
+    return min(max(hinted, jittered), MAX_RETRY_DELAY_SECONDS)
+
+
+def import_genai() -> Any:
+    """
+    Import google.generativeai on first use.
+    
+    Returns:
+        The google.generativeai module
+    """
+    import google.generativeai as genai
+    return genai
+
+
+@functools.lru_cache(maxsize=1)
+def configure_gemini() -> Any:
+    """
+    Configure the SDK with the API key, once per process.
+    
+    genai.configure() drops the SDK's cached clients, so calling it again
+    (e.g. from each tool) would throw away the open gRPC channel.
+    
+    Returns:
+        The configured google.generativeai module
+    """
+    genai = import_genai()
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    return genai
+
+
+def prepare_generation_config(generation_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a generation config's response schema to protos once, so the SDK
+    doesn't re-normalize the dict on every call.
+    
+    Args:
+        generation_config: Generation config dict (may include a dict response_schema)
+        
+    Returns:
+        Equivalent generation config ready to pass to generate_content
+    """
+    genai = import_genai()
+    return genai.types.generation_types.to_generation_config_dict(generation_config)
+
+
+def _safety_settings() -> Dict[Any, Any]:
+    """Safety settings shared by every model (nothing blocked; replies are user-facing chat)."""
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold
+    return {
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+    }
+
+
+@functools.lru_cache(maxsize=1)
+def get_gemini_model() -> Optional[Any]:
+    """
+    Get the shared Gemini model, creating it on first use.
+    
+    Returns:
+        GenerativeModel instance, or None if the SDK or API key is missing
+        or no model could be initialized
+    """
+    if not GEMINI_AVAILABLE or not settings.GEMINI_API_KEY:
+        return None
+    
+    model_names = list(GEMINI_MODEL_NAMES)
+    if settings.GEMINI_MODEL:
+        model_names = [settings.GEMINI_MODEL] + [name for name in model_names if name != settings.GEMINI_MODEL]
+    
+    try:
+        genai = configure_gemini()
+        safety_settings = _safety_settings()
+    except Exception as e:
+        logger.error(f"Failed to configure Gemini: {e}")
+        return None
+    
+    for model_name in model_names:
+        try:
+            model = genai.GenerativeModel(model_name=model_name, safety_settings=safety_settings)
+            logger.info(f"✅ Gemini model initialized successfully with {model_name}")
+            return model
+        except Exception as model_error:
+            logger.debug("Failed to initialize with %s: %s", model_name, model_error)
+    
+    logger.error(f"Failed to initialize Gemini with any model: {model_names}")
+    return None
+
+
+async def create_context_cached_model(
+    model: Any,
+    system_instruction: str,
+    ttl_seconds: int,
+    display_name: str = "evara-instructions"
+) -> Optional[Any]:
+    """
+    Store a static system instruction in a Gemini context cache and return a
+    model that uses it, so repeated calls are billed the cached-token rate for it.
+    
+    The API rejects caches below the model's minimum size (1024+ tokens) and
+    models without explicit caching support; both are reported as None. Transient
+    failures (timeouts, rate limits, server and network errors) are raised, so the
+    caller can try again later.
+    
+    Args:
+        model: Model whose model name the cache is created for
+        system_instruction: Static instructions to cache
+        ttl_seconds: Lifetime of the cache on the server
+        display_name: Name shown for the cache in the Gemini API
+        
+    Returns:
+        GenerativeModel bound to the cached content, or None if caching isn't supported
+        
+    Raises:
+        Exception: If creating the cache failed with a retryable error
+    """
+    genai = import_genai()
+    
+    def create() -> Any:
+        cached = genai.caching.CachedContent.create(
+            model=model.model_name,
+            display_name=display_name,
+            system_instruction=system_instruction,
+            ttl=datetime.timedelta(seconds=ttl_seconds)
+        )
+        return genai.GenerativeModel.from_cached_content(cached, safety_settings=_safety_settings())
+    
+    try:
+        # CachedContent.create is a blocking API call
+        cached_model = await asyncio.wait_for(asyncio.to_thread(create), settings.GEMINI_TIMEOUT_SECONDS)
+    except Exception as e:
+        if is_retryable_error(e):
+            logger.warning(f"Could not create Gemini context cache for {model.model_name}: {e}")
+            raise
+        logger.warning(f"Gemini context cache unavailable for {model.model_name}: {e}")
+        return None
+    
+    logger.info(f"✅ Gemini context cache created for {model.model_name} (TTL {ttl_seconds}s)")
+    return cached_model
+
+
+async def delete_context_cache(cached_model: Any) -> None:
+    """
+    Delete the server-side context cache behind a model from create_context_cached_model,
+    so a cache that's no longer used isn't billed until its TTL runs out.
+    
+    Args:
+        cached_model: GenerativeModel bound to the cached content
+    """
+    from google.generativeai import client, protos
+    
+    name = cached_model.cached_content
+    if not name:
+        return
+    
+    def delete() -> None:
+        request = protos.DeleteCachedContentRequest(name=name)
+        client.get_default_cache_client().delete_cached_content(request)
+    
+    try:
+        await asyncio.wait_for(asyncio.to_thread(delete), settings.GEMINI_TIMEOUT_SECONDS)
+    except Exception as e:
+        # Already gone (e.g. evicted) or unreachable; the server drops it at its TTL anyway
+        logger.debug("Could not delete Gemini context cache %s: %s", name, e)
@@ -49,6 +49,36 @@ def get_help_message() -> str:
     )
 
 
+def get_thanks_message() -> str:
+    """
+    Get reply for a plain thank-you message.
+    
+    Returns:
+        Thanks reply string
+    """
+    return "😊 You're welcome! Let me know if there's anything else I can help with."
+
+
+# Friendly messages per error type ("general" is the fallback)
+_ERROR_MESSAGES = {
+    "initialization": (
+        "⚠️ Sorry, I'm not fully initialized yet. "
+        "Please try again in a moment."
+    ),
+    "processing": (
+        "😅 Oops, something went wrong processing your message. "
+        "Could you try rephrasing your request?"
+    ),
+    "api": (
+        "🌐 I'm having trouble connecting to external services. "
+        "Please try again in a moment."
+    ),
+    "general": (
+        "😅 Oops, something went wrong. Try again?"
+    )
+}
+
+
 def get_friendly_error_message(error_type: str = "general") -> str:
     """
     Get friendly error message for users.
@@ -60,23 +90,5 @@ def get_friendly_error_message(error_type: str = "general") -> str:
     Returns:
         Friendly error message
     """
-    messages = {
-        "initialization": (
-            "⚠️ Sorry, I'm not fully initialized yet. "
-            "Please try again in a moment."
-        ),
-        "processing": (
-            "😅 Oops, something went wrong processing your message. "
-            "Could you try rephrasing your request?"
-        ),
-        "api": (
-            "🌐 I'm having trouble connecting to external services. "
-            "Please try again in a moment."
-        ),
-        "general": (
-            "😅 Oops, something went wrong. Try again?"
-        )
-    }
-    
-    return messages.get(error_type, messages["general"])
+    return _ERROR_MESSAGES.get(error_type, _ERROR_MESSAGES["general"])
 
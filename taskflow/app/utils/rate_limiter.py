@@ -3,8 +3,8 @@ Rate limiting utility for TaskFlow.
 Prevents spam by limiting messages per user per time window.
 """
 import time
-from typing import Dict, List
-from collections import defaultdict
+from typing import Deque, Dict
+from collections import defaultdict, deque
 import logging
 
 logger = logging.getLogger("taskflow")
@@ -26,8 +26,10 @@ class RateLimiter:
         """
         self.max_messages = max_messages
         self.window_seconds = window_seconds
-        # Store timestamps per user: {user_number: [timestamp1, timestamp2, ...]}
-        self._user_timestamps: Dict[str, List[float]] = defaultdict(list)
+        # Store timestamps per user, oldest first: {user_number: deque([timestamp1, timestamp2, ...])}
+        # At most max_messages timestamps are ever kept per user
+        self._user_timestamps: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.max_messages))
+        self._last_sweep = time.time()
         self._lock = {}  # Simple per-user lock (not thread-safe, but good enough for single process)
     
     def is_allowed(self, user_number: str) -> tuple[bool, str]:
@@ -45,27 +47,37 @@ class RateLimiter:
         now = time.time()
         normalized_number = self._normalize_number(user_number)
         
-        # Clean old timestamps outside the window
+        # Clean old timestamps outside the window (they're in order, so pop from the left)
         cutoff_time = now - self.window_seconds
+        self._sweep_idle_users(now, cutoff_time)
         timestamps = self._user_timestamps[normalized_number]
-        self._user_timestamps[normalized_number] = [
-            ts for ts in timestamps if ts > cutoff_time
-        ]
+        while timestamps and timestamps[0] <= cutoff_time:
+            timestamps.popleft()
         
         # Check if user has exceeded limit
-        current_count = len(self._user_timestamps[normalized_number])
+        current_count = len(timestamps)
         
         if current_count >= self.max_messages:
-            remaining_time = int(self.window_seconds - (now - self._user_timestamps[normalized_number][0]))
+            remaining_time = int(self.window_seconds - (now - timestamps[0]))
             if remaining_time < 0:
                 remaining_time = 0
             return False, f"⏱️ Too many messages! Please wait {remaining_time} seconds before sending another message."
         
         # Add current timestamp
-        self._user_timestamps[normalized_number].append(now)
+        timestamps.append(now)
         
         return True, ""
     
+    def _sweep_idle_users(self, now: float, cutoff_time: float) -> None:
+        """Forget users with no messages in the window (at most once per window)."""
+        if now - self._last_sweep < self.window_seconds:
+            return
+        self._last_sweep = now
+        idle = [number for number, timestamps in self._user_timestamps.items()
+                if not timestamps or timestamps[-1] <= cutoff_time]
+        for number in idle:
+            del self._user_timestamps[number]
+    
     def _normalize_number(self, number: str) -> str:
         """Normalize phone number for consistent storage."""
         if number.startswith("whatsapp:"):
@@ -0,0 +1,296 @@
+"""
+Semantic cache for TaskFlow.
+Caches Gemini results keyed by sentence embeddings so that paraphrased
+messages ("flights to mumbai" / "show me mumbai flights") skip the API call.
+An exact-match tier in front of it answers repeated identical messages
+without computing an embedding.
+"""
+import hashlib
+import json
+import logging
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, List, Optional
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    SEMANTIC_CACHE_AVAILABLE = True
+except ImportError:
+    SEMANTIC_CACHE_AVAILABLE = False
+    np = None
+    SentenceTransformer = None
+
+logger = logging.getLogger("taskflow")
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+
+# Recent embeddings kept so one message isn't re-encoded for each cache lookup/store
+EMBEDDING_MEMO_SIZE = 256
+
+
+def _normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so trivial variations match identically."""
+    return " ".join(text.lower().split())
+
+
+class ExactMatchCache:
+    """
+    LRU cache of results keyed by a hash of the namespace and (normalized) text.
+
+    Needs no optional dependencies, so it works whether or not the semantic
+    cache is available. Entries expire after a TTL.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: int = 3600, normalize: bool = True):
+        """
+        Initialize exact-match cache.
+
+        Args:
+            max_entries: Maximum number of cached entries
+            ttl_seconds: Seconds before an entry expires
+            normalize: Lowercase and collapse whitespace before keying (False = byte-exact keys)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.normalize = normalize
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, namespace: str, text: str) -> bytes:
+        """Hash the namespace and text into a compact key."""
+        if self.normalize:
+            text = _normalize_text(text)
+        return hashlib.blake2b(f"{namespace}|{text}".encode("utf-8"), digest_size=16).digest()
+
+    def get(self, namespace: str, text: str) -> Optional[Any]:
+        """
+        Look up the cached value for exactly this text in a namespace.
+
+        Args:
+            namespace: Cache namespace (e.g. "intent:<user_number>")
+            text: Text to look up
+
+        Returns:
+            Cached value, or None on a miss
+        """
+        key = self._key(namespace, text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, value = entry
+            if time.time() - created_at >= self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, namespace: str, text: str, value: Any) -> None:
+        """
+        Store a value for exactly this text in a namespace.
+
+        Args:
+            namespace: Cache namespace (e.g. "intent:<user_number>")
+            text: Text the value was produced for
+            value: Value to cache
+        """
+        key = self._key(namespace, text)
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SemanticCache:
+    """
+    In-memory cache of results keyed by L2-normalized sentence embeddings.
+
+    Lookups compute the cosine similarity between the query embedding and
+    every stored embedding in a single matrix-vector product, and return the
+    best match if it scores at or above the threshold. Entries are namespaced
+    (e.g. per user) so cached results are never shared across users, expire
+    after a TTL, and the least-recently-used entry is evicted at capacity.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.87,
+        max_entries: int = 1024,
+        ttl_seconds: int = 3600
+    ):
+        """
+        Initialize semantic cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a cache hit
+            max_entries: Maximum number of cached entries
+            ttl_seconds: Seconds before an entry expires
+        """
+        if not SEMANTIC_CACHE_AVAILABLE:
+            raise RuntimeError("numpy and sentence-transformers are required for SemanticCache")
+
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._encoder = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        self._embeddings = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        self._namespaces = np.empty(0, dtype=object)
+        self._created_at = np.empty(0, dtype=np.float64)
+        self._last_used = np.empty(0, dtype=np.float64)
+        self._values: List[Any] = []
+        self._lock = threading.Lock()
+        self._embedding_memo: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+    def encode(self, text: str) -> "np.ndarray":
+        """
+        Embed text as an L2-normalized vector.
+
+        A message is typically looked up and stored in both the intent and the
+        response cache, so recent embeddings are memoized.
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            Embedding of shape (EMBEDDING_DIM,)
+        """
+        text = _normalize_text(text)
+        with self._memo_lock:
+            embedding = self._embedding_memo.get(text)
+            if embedding is not None:
+                self._embedding_memo.move_to_end(text)
+                return embedding
+
+        embedding = np.asarray(self._encoder.encode(text, normalize_embeddings=True), dtype=np.float32)
+        embedding.flags.writeable = False
+        with self._memo_lock:
+            self._embedding_memo[text] = embedding
+            while len(self._embedding_memo) > EMBEDDING_MEMO_SIZE:
+                self._embedding_memo.popitem(last=False)
+        return embedding
+
+    def get(self, namespace: str, text: str, threshold: Optional[float] = None) -> Optional[Any]:
+        """
+        Look up the cached value for the most similar text in a namespace.
+
+        Args:
+            namespace: Cache namespace (e.g. "intent:<user_number>")
+            text: Text to look up
+            threshold: Minimum cosine similarity for this lookup (defaults to the cache's threshold)
+
+        Returns:
+            Cached value, or None on a miss
+        """
+        if threshold is None:
+            threshold = self.threshold
+        query = self.encode(text)
+
+        with self._lock:
+            if not self._values:
+                return None
+
+            now = time.time()
+            scores = self._embeddings @ query
+            valid = (self._namespaces == namespace) & (now - self._created_at < self.ttl_seconds)
+            scores = np.where(valid, scores, -1.0)
+
+            idx = int(np.argmax(scores))
+            if scores[idx] < threshold:
+                return None
+
+            self._last_used[idx] = now
+            logger.debug("Semantic cache hit in %s (similarity: %.3f)", namespace, scores[idx])
+            return self._values[idx]
+
+    def put(self, namespace: str, text: str, value: Any) -> None:
+        """
+        Store a value for the given text in a namespace.
+
+        Args:
+            namespace: Cache namespace (e.g. "intent:<user_number>")
+            text: Text the value was produced for
+            value: Value to cache
+        """
+        embedding = self.encode(text)
+
+        with self._lock:
+            now = time.time()
+            if len(self._values) < self.max_entries:
+                self._embeddings = np.vstack([self._embeddings, embedding])
+                self._namespaces = np.append(self._namespaces, np.array([namespace], dtype=object))
+                self._created_at = np.append(self._created_at, now)
+                self._last_used = np.append(self._last_used, now)
+                self._values.append(value)
+            else:
+                # Overwrite the least-recently-used slot in place
+                idx = int(np.argmin(self._last_used))
+                self._embeddings[idx] = embedding
+                self._namespaces[idx] = namespace
+                self._created_at[idx] = now
+                self._last_used[idx] = now
+                self._values[idx] = value
+
+    def save(self, path: Path) -> None:
+        """
+        Write unexpired entries to disk atomically, so the cache survives restarts.
+        Values must be JSON-serializable.
+
+        Args:
+            path: Destination .npz file
+        """
+        with self._lock:
+            live = time.time() - self._created_at < self.ttl_seconds
+            embeddings = self._embeddings[live]
+            namespaces = self._namespaces[live].astype(str)
+            created_at = self._created_at[live]
+            last_used = self._last_used[live]
+            values = [json.dumps(value, ensure_ascii=False) for value, keep in zip(self._values, live) if keep]
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".npz", delete=False) as f:
+            temp_file = Path(f.name)
+            np.savez(
+                f,
+                embeddings=embeddings,
+                namespaces=namespaces,
+                created_at=created_at,
+                last_used=last_used,
+                values=np.array(values, dtype=str)
+            )
+        temp_file.replace(path)
+        logger.debug("Saved %d semantic cache entries to %s", len(values), path)
+
+    def load(self, path: Path) -> None:
+        """
+        Replace the cache contents with entries saved by save(), dropping expired ones.
+
+        Args:
+            path: .npz file written by save()
+        """
+        with np.load(path, allow_pickle=False) as data:
+            now = time.time()
+            live = now - data["created_at"] < self.ttl_seconds
+            # Keep the most recently used entries if the file holds more than fit
+            order = np.argsort(-data["last_used"][live])[:self.max_entries]
+            embeddings = data["embeddings"][live][order].astype(np.float32)
+            if embeddings.shape[1:] != (EMBEDDING_DIM,):
+                raise ValueError(f"Unexpected embedding shape {embeddings.shape} in {path}")
+            namespaces = data["namespaces"][live][order].astype(object)
+            created_at = data["created_at"][live][order]
+            last_used = data["last_used"][live][order]
+            values = [json.loads(value) for value in data["values"][live][order]]
+
+        with self._lock:
+            self._embeddings = embeddings
+            self._namespaces = namespaces
+            self._created_at = created_at
+            self._last_used = last_used
+            self._values = values
+        logger.info(f"Loaded {len(values)} semantic cache entries from {path}")